@@ -1,26 +1,54 @@
 import asyncio
-import base64
-import json
 import logging
-from typing import Any
+import socket
+from binascii import a2b_base64, b2a_base64
+from collections import deque
+from functools import partial
 
 import aiohttp
+import msgspec
+import orjson
 import websockets
 from starlette.websockets import WebSocket, WebSocketDisconnect, WebSocketState
 
 from transcription import broadcast_transcription
 from utils.audio import convert_mulaw_to_pcm
 from utils.calls import CallSession
+from utils.messages import (
+    decode_palabra_data,
+    palabra_audio_decoder,
+    palabra_decoder,
+    palabra_transcription_decoder,
+    twilio_decoder,
+)
+from utils.writer import QueuedWriter
 
 logger = logging.getLogger(__name__)
 
+# Writer backlog limits, about 5 s of audio: 320 ms input chunks to Palabra, 20 ms media frames to Twilio
+PALABRA_MAX_QUEUE = 16
+TWILIO_MAX_QUEUE = 250
+
+
+def _set_low_latency(sock: socket.socket | None) -> None:
+    """Disable Nagle and delayed ACKs on a connected TCP socket."""
+    if sock is None:
+        return
+
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if hasattr(socket, 'TCP_QUICKACK'):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+    except OSError as e:
+        logger.warning('Failed to tune socket options: %s', e)
+
 
 class AudioBridge:
-    def __init__(self, app, call_session: CallSession, role: str, settings: dict):
+    def __init__(self, app, call_session: CallSession, role: str, set_task_message: bytes):
         self.app = app
         self.http_session: aiohttp.ClientSession = app.http_client
         self.call_session: CallSession = call_session
-        self.settings: dict[str, Any] = settings
+        self.set_task_message: bytes = set_task_message
         self.role: str = role
 
         if role == 'client':
@@ -35,25 +63,30 @@ class AudioBridge:
         self.palabra_session_id: str | None = None
         self._palabra_receive_task: asyncio.Task | None = None
         self._twilio_receive_task: asyncio.Task | None = None
+        self._palabra_writer: QueuedWriter | None = None
+        self._twilio_writer: QueuedWriter | None = None
         self._cleanup_lock = asyncio.Lock()
+        self._task_confirmed = asyncio.Event()
         self.original_audio_queue = asyncio.Queue()
         self.translated_audio_queue = asyncio.Queue()
         self.block_size = 960  # in bytes for pcm_s16le 24 khz with 20 ms
+        self._resample_state = None
 
     async def _create_palabra_session(self) -> dict:
         url = 'https://api.palabra.ai/session-storage/session'
         payload = {'data': {'subscriber_count': 0, 'publisher_can_subscribe': True}}
 
-        response = await self.http_session.post(url, json=payload)
-        response.raise_for_status()
-
-        return await response.json()
+        async with self.http_session.post(url, json=payload) as response:
+            response.raise_for_status()
+            return await response.json()
 
     async def _delete_palabra_session(self):
         if self.palabra_session_id:
             url = f'https://api.palabra.ai/session-storage/sessions/{self.palabra_session_id}'
-            response = await self.http_session.delete(url)
-            response.raise_for_status()
+            async with self.http_session.delete(url) as response:
+                response.raise_for_status()
+                # Drain the body so the keep-alive connection goes back to the pool
+                await response.read()
 
             self.palabra_session_id = None
 
@@ -66,12 +99,32 @@ class AudioBridge:
             publisher = session['data']['publisher']
             url = f'{ws_url}?token={publisher}'
 
-            self.palabra_ws = await websockets.connect(url, ping_interval=3, ping_timeout=60)
+            self.palabra_ws = await websockets.connect(url, ping_interval=3, ping_timeout=60, compression=None)
             logger.info('Palabra websocket connected for role %s', self.role)
-            await self.send({'message_type': 'set_task', 'data': self.settings})
+            _set_low_latency(self.palabra_ws.transport.get_extra_info('socket'))
+            self._palabra_writer = QueuedWriter(
+                partial(self.palabra_ws.send, text=True),
+                name=f'palabra-writer-{self.role}',
+                on_error=self.close,
+                max_queue=PALABRA_MAX_QUEUE,
+            )
+            self._twilio_writer = QueuedWriter(
+                self.target_ws.send_text,
+                name=f'twilio-writer-{self.role}',
+                on_error=self.close,
+                max_queue=TWILIO_MAX_QUEUE,
+            )
 
             self._running = True
             self._palabra_receive_task = asyncio.create_task(self._receive_from_palabra())
+            self._palabra_writer.send(self.set_task_message)
+
+            # Start streaming only once Palabra has accepted the task
+            try:
+                await asyncio.wait_for(self._task_confirmed.wait(), timeout=10)
+            except TimeoutError:
+                logger.warning('Task was not confirmed for role %s, streaming anyway', self.role)
+
             self._twilio_receive_task = asyncio.create_task(self._receive_from_twilio())
             self._sender_task = asyncio.create_task(self._sender())
 
@@ -88,102 +141,100 @@ class AudioBridge:
 
     async def _receive_from_twilio(self):
         """Receive audio data from Twilio and send it to the Palabra API."""
-        buffer = bytearray()
-        buffer_size = int(8_000 * 0.320)  # 320 ms of mulaw chunks
+        # Converted frames are collected as-is and joined once per full chunk
+        frames: deque[bytes] = deque()
+        pending = 0
+        buffer_size = int(24_000 * 0.320) * 2  # 320 ms of pcm_s16le 24 khz
 
         try:
             async for message in self.source_ws.iter_text():
                 if not self._running:
                     break
 
-                data = json.loads(message)
-                if data['event'] == 'media':
-                    audio_data = data['media']['payload']
-                    audio_data = base64.b64decode(audio_data)
-                    buffer += audio_data
+                frame = twilio_decoder.decode(message)
+                if frame.event == 'media':
+                    audio_data = a2b_base64(frame.media.payload)
+                    # Every frame is converted exactly once, the result feeds both Palabra and the mixer.
+                    # A 20 ms frame takes about a microsecond, far less than a thread pool hop would cost.
+                    converted_audio_data, self._resample_state = convert_mulaw_to_pcm(audio_data, self._resample_state)
+                    frames.append(converted_audio_data)
+                    pending += len(converted_audio_data)
 
-                    converted_audio_data = convert_mulaw_to_pcm(audio_data)
                     if self.role == 'client':
                         self.original_audio_queue.put_nowait(audio_data)
                     else:
                         self.original_audio_queue.put_nowait(converted_audio_data)
 
-                    if len(buffer) >= buffer_size:
+                    if pending >= buffer_size:
+                        buffer = b''.join(frames)
+                        frames.clear()
                         chunk = buffer[:buffer_size]
-                        buffer = buffer[buffer_size:]
+                        if len(buffer) > buffer_size:
+                            frames.append(buffer[buffer_size:])
+                        pending -= buffer_size
 
-                        try:
-                            audio_data = await self.app.process_managers['mulaw_to_pcm'].submit(chunk)
-                            message = {
-                                'message_type': 'input_audio_data',
-                                'data': {'data': base64.b64encode(audio_data).decode('utf-8')},
-                            }
-                            await self.send(message)
-                        except Exception as e:
-                            logger.error(f'Audio conversion error: {e!r}')
-                elif data['event'] == 'start':
-                    stream_sid = data['start']['streamSid']
+                        message = {
+                            'message_type': 'input_audio_data',
+                            'data': {'data': b2a_base64(chunk, newline=False).decode('ascii')},
+                        }
+                        self.send(message)
+                elif frame.event == 'start':
+                    stream_sid = frame.start.stream_sid
                     if self.role == 'client':
-                        logger.info(f'Incoming client stream has started {stream_sid}')
+                        logger.info('Incoming client stream has started %s', stream_sid)
                         self.call_session.client_stream_sid = stream_sid
                         self.call_session.client_stream_sid_event.set()
                     else:
-                        logger.info(f'Incoming operator stream has started {stream_sid}')
+                        logger.info('Incoming operator stream has started %s', stream_sid)
                         self.call_session.operator_stream_sid = stream_sid
                         self.call_session.operator_stream_sid_event.set()
         except WebSocketDisconnect:
             logger.info('Client disconnected.')
         except Exception as e:
-            logger.error(f'Error in _receive_from_twilio: {e}')
+            logger.error('Error in _receive_from_twilio: %s', e)
         finally:
             # Process remaining buffer data
-            if buffer and self._running:
+            if pending and self._running:
                 try:
-                    audio_data = await self.app.process_managers['mulaw_to_pcm'].submit(bytes(buffer))
-                    # audio_data = await convert_mulaw_to_pcm(bytes(buffer))
                     message = {
                         'message_type': 'input_audio_data',
-                        'data': {'data': base64.b64encode(audio_data).decode('utf-8')},
+                        'data': {'data': b2a_base64(b''.join(frames), newline=False).decode('ascii')},
                     }
-
-                    for i in range(0, len(audio_data), self.block_size):
-                        self.original_audio_queue.put_nowait(audio_data[i : i + self.block_size])
-
-                    await self.send(message)
+                    self.send(message)
                 except Exception as e:
-                    logger.error(f'Error processing remaining buffer: {e}')
+                    logger.error('Error processing remaining buffer: %s', e)
 
     async def _receive_from_palabra(self):
         """Receive loop with proper error handling and cleanup."""
 
         while self.palabra_ws:
             try:
-                msg = await asyncio.wait_for(self.palabra_ws.recv(), timeout=60)
-                data = json.loads(msg)
-                if isinstance(data.get('data'), str):
-                    data['data'] = json.loads(data['data'])
+                # Raw frame bytes go straight to the decoder, skipping the UTF-8 decode to str.
+                # Dead connections are detected by the keepalive pings, so no per-recv timeout is needed
+                msg = await self.palabra_ws.recv(decode=False)
+                message = palabra_decoder.decode(msg)
 
-                msg_type = data.get('message_type')
+                msg_type = message.message_type
                 if msg_type == 'current_task':
                     logger.info('Task confirmed')
+                    self._task_confirmed.set()
                 elif msg_type == 'output_audio_data' and self.role == 'operator':
                     # Handle TTS audio
-                    transcription_data = data.get('data', {})
-                    audio_b64 = transcription_data.get('data', '')
+                    audio_b64 = decode_palabra_data(message.data, palabra_audio_decoder).data
 
                     if audio_b64:
                         try:
-                            audio_data = base64.b64decode(audio_b64)
+                            audio_data = a2b_base64(audio_b64)
 
                             for i in range(0, len(audio_data), self.block_size):
                                 self.translated_audio_queue.put_nowait(audio_data[i : i + self.block_size])
                         except Exception as e:
-                            logger.error(f'Audio decode error: {e!r}')
+                            logger.error('Audio decode error: %r', e)
                 elif 'transcription' in msg_type:
-                    transcription = data.get('data', {}).get('transcription', {})
-                    text = transcription.get('text', '')
-                    lang = transcription.get('language', '')
-                    transcription_id = transcription.get('transcription_id')
+                    transcription = decode_palabra_data(message.data, palabra_transcription_decoder).transcription
+                    text = transcription.text
+                    lang = transcription.language
+                    transcription_id = transcription.transcription_id
 
                     if text and transcription_id:
                         if msg_type == 'translated_transcription':
@@ -193,17 +244,25 @@ class AudioBridge:
             except websockets.exceptions.ConnectionClosed:
                 logger.info('WebSocket connection closed')
                 break
-            except asyncio.TimeoutError:
-                logger.info('WebSocket receive timeout')
-                continue
+            except msgspec.ValidationError as e:
+                logger.warning('Unexpected Palabra message: %s', e)
             except Exception as e:
-                logger.error(f'WebSocket error: {e}')
+                logger.error('WebSocket error: %s', e)
                 break
 
     async def _sender(self):
         await self.call_session.client_stream_sid_event.wait()
         await self.call_session.operator_stream_sid_event.wait()
 
+        stream_sid = (
+            self.call_session.operator_stream_sid if self.role == 'client' else self.call_session.client_stream_sid
+        )
+        assert stream_sid is not None, 'streamSid must be set'
+
+        # The media envelope only differs in payload, so build it around the base64 string directly
+        media_prefix = '{"event":"media","streamSid":' + orjson.dumps(stream_sid).decode() + ',"media":{"payload":"'
+        media_suffix = '"}}'
+
         while True:
             try:
                 original_chunk = await self.original_audio_queue.get()
@@ -225,38 +284,20 @@ class AudioBridge:
                 else:
                     audio_data = original_chunk
 
-                audio_payload = base64.b64encode(audio_data).decode('utf-8')
-                stream_sid = (
-                    self.call_session.operator_stream_sid
-                    if self.role == 'client'
-                    else self.call_session.client_stream_sid
-                )
-                assert stream_sid is not None, 'streamSid must be set'
-
-                audio_delta = {
-                    'event': 'media',
-                    'streamSid': stream_sid,
-                    'media': {
-                        'payload': audio_payload,
-                    },
-                }
+                audio_payload = b2a_base64(audio_data, newline=False).decode('ascii')
                 if self.target_ws.client_state == WebSocketState.DISCONNECTED:
                     logger.info('target speaker was disconnected')
                     await self.close()
                     break
 
-                await self.target_ws.send_json(audio_delta)
+                self._twilio_writer.send(media_prefix + audio_payload + media_suffix)
             except Exception as e:
                 logger.error('Failed during sender: %s', e)
 
-    async def send(self, message: dict):
-        """Send message with proper connection state checking."""
-        if self.palabra_ws:
-            try:
-                await self.palabra_ws.send(json.dumps(message))
-            except Exception as e:
-                logger.error('Error sending message: %s', e)
-                await self.close()
+    def send(self, message: dict):
+        """Queue message for the Palabra writer task."""
+        if self._palabra_writer:
+            self._palabra_writer.send(orjson.dumps(message))
         else:
             raise RuntimeError('impossible')
 
@@ -283,14 +324,18 @@ class AudioBridge:
                 except asyncio.CancelledError:
                     pass
 
+            if self._twilio_writer:
+                await self._twilio_writer.close()
+
             # Close WebSocket connections
             if self.palabra_ws:
-                await self.send(
+                self.send(
                     {
                         'message_type': 'end_task',
                         'data': {'force': False},
                     }
                 )
+                await self._palabra_writer.close()
 
                 try:
                     await self.palabra_ws.close()
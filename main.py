@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import os
 from contextlib import asynccontextmanager
@@ -15,11 +16,17 @@ from twilio.rest import Client
 from twilio.twiml.voice_response import Connect, Play, VoiceResponse
 
 from bridge import AudioBridge
-from settings import host, role_settings
+from settings import host, set_task_messages
 from transcription import transcription_websockets
-from utils.audio import BaseWorkerProcess, MixingWorker, MulawToPcmWorker
-from utils.calls import CallSession, get_free_operator_number, make_call_to_operator, verify_twilio_signature
-from utils.worker import AsyncProcessManager
+from utils.audio import BaseWorkerProcess, MixingWorker
+from utils.calls import (
+    CallSession,
+    SessionStore,
+    get_free_operator_number,
+    make_call_to_operator,
+    verify_twilio_signature,
+)
+from utils.worker import AsyncProcessManager, parse_cpus, parse_nice, set_scheduling
 
 # Configure logging
 logging.basicConfig(
@@ -31,9 +38,17 @@ logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app) -> None:
+    event_loop = asyncio.get_running_loop()
+    if not type(event_loop).__module__.startswith('uvloop'):
+        logger.warning('uvloop is not active, falling back to %s', type(event_loop).__name__)
+
     app.process_managers: dict[str, BaseWorkerProcess] = {}
-    app.process_managers['mixer'] = AsyncProcessManager(MixingWorker, processes=2)
-    app.process_managers['mulaw_to_pcm'] = AsyncProcessManager(MulawToPcmWorker, processes=2)
+    app.process_managers['mixer'] = AsyncProcessManager(
+        MixingWorker,
+        processes=2,
+        cpus=parse_cpus(os.getenv('WORKER_CPUS')),
+        nice=parse_nice(os.getenv('WORKER_NICE')),
+    )
     app.http_client = aiohttp.ClientSession(
         connector=aiohttp.TCPConnector(keepalive_timeout=300),
         headers={
@@ -47,10 +62,12 @@ async def lifespan(app) -> None:
         http_client=AsyncTwilioHttpClient(timeout=300),
     )
     app.twilio_validator = RequestValidator(os.getenv('TWILIO_AUTH_TOKEN'))
+    session_sweeper = asyncio.create_task(session_store.run_sweeper())
 
     try:
         yield
     finally:
+        session_sweeper.cancel()
         for manager in app.process_managers.values():
             await manager.close()
 
@@ -77,7 +94,7 @@ def create_app() -> FastAPI:
 
 
 app = create_app()
-session_store: dict[str, CallSession] = {}
+session_store = SessionStore(ttl=3600)
 
 
 @app.post('/twiml/client', dependencies=[Depends(verify_twilio_signature)])
@@ -86,7 +103,7 @@ async def twiml_handler(request: Request):
     from_number = form_data.get('From')
     session = CallSession(from_number, get_free_operator_number())
     session.client_sid = form_data.get('CallSid')
-    session_store[session.session_id] = session
+    session_store.add(session)
 
     await make_call_to_operator(app.twilio_client, session)
 
@@ -106,7 +123,9 @@ async def voice_callback(request: Request, session_id: str):
     to_number = form_data.get('To')
     call_status = form_data.get('CallStatus')
 
-    logging.info(f'Outbound target call from {from_number} to {to_number} with SID: {call_sid}, Status: {call_status}')
+    logger.info(
+        'Outbound target call from %s to %s with SID: %s, Status: %s', from_number, to_number, call_sid, call_status
+    )
     if call_status != 'in-progress':
         raise HTTPException(
             status_code=500,
@@ -137,8 +156,10 @@ async def voice_callback(request: Request, session_id: str):
     twiml_operator_response.append(connect)
 
     # Both client and operator are successfully connected to the Twilio, so start streaming
-    await app.twilio_client.calls(call_session.client_sid).update_async(twiml=str(twiml_client_response))
-    await app.twilio_client.calls(call_session.operator_sid).update_async(twiml=str(twiml_operator_response))
+    await asyncio.gather(
+        app.twilio_client.calls(call_session.client_sid).update_async(twiml=str(twiml_client_response)),
+        app.twilio_client.calls(call_session.operator_sid).update_async(twiml=str(twiml_operator_response)),
+    )
 
     return Response(status_code=200)
 
@@ -155,7 +176,7 @@ async def voice_disconnect(request: Request, role: str, session_id: str):
         )
 
     if call_session.completed:
-        del session_store[session_id]
+        session_store.pop(session_id)
         return Response(status_code=200)
 
     if role == 'client':
@@ -184,18 +205,25 @@ async def handle_media_stream(websocket: WebSocket, role: str, session_id: str):
     else:
         call_session.target_websocket = websocket
 
-    logging.info(f'{role} connected')
-    await websocket.accept()
+    # Keep the session out of expiry while its streams are open
+    call_session.stream_started()
+    try:
+        logger.info('%s connected', role)
+        await websocket.accept()
 
-    # Wait shortly until streaming starts for both speakers
-    await call_session.barrier.wait()
+        # Wait shortly until streaming starts for both speakers
+        await call_session.barrier.wait()
 
-    assert call_session.target_websocket is not None, 'Target websocket must be set'
-    assert call_session.source_websocket is not None, 'Source websocket must be set'
+        assert call_session.target_websocket is not None, 'Target websocket must be set'
+        assert call_session.source_websocket is not None, 'Source websocket must be set'
 
-    bridge = AudioBridge(app, call_session, role, role_settings[role])
-    await bridge.run()
-    await bridge.close()
+        bridge = AudioBridge(app, call_session, role, set_task_messages[role])
+        try:
+            await bridge.run()
+        finally:
+            await bridge.close()
+    finally:
+        call_session.stream_ended()
 
 
 @app.get('/transcription', response_class=HTMLResponse)
@@ -218,15 +246,21 @@ async def transcription_websocket(websocket: WebSocket):
     except WebSocketDisconnect:
         transcription_websockets.discard(websocket)
     except Exception as e:
-        logging.error(f'Error in transcription WebSocket: {e}')
+        logger.error('Error in transcription WebSocket: %s', e)
         transcription_websockets.discard(websocket)
 
 
 def main():
+    # Keep the event loop next to the NIC queues, worker processes inherit the mask
+    set_scheduling(parse_cpus(os.getenv('CPU_AFFINITY')))
+
     uvicorn.run(
         app,
         host='0.0.0.0',
         loop='uvloop',
+        http='httptools',
+        # Audio frames are base64 and do not compress, deflate only costs CPU and memory
+        ws_per_message_deflate=False,
         port=int(os.getenv('PORT')),
     )
 
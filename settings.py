@@ -1,57 +1,101 @@
-import copy
 import os
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Any
+
+import orjson
 
 host = os.getenv('HOST')
-client_settings = {
-    'input_stream': {
-        'content_type': 'audio',
-        'source': {
-            'type': 'ws',
-            'format': 'pcm_s16le',
-            'sample_rate': 24_000,
-            'channels': 1,
-        },
-    },
-    'output_stream': {
-        'content_type': 'audio',
-        'target': {'type': 'ws', 'format': 'pcm_s16le', 'sample_rate': 24_000, 'channels': 1},
-    },
-    'pipeline': {
-        'preprocessing': {},
-        'transcription': {
-            'source_language': os.getenv('SOURCE_LANGUAGE'),
-            'detectable_languages': ['ru', 'en', 'de', 'es', 'tr'],
-            'asr_model': 'auto',
-            'segment_confirmation_silence_threshold': 0.7,
-            'sentence_splitter': {
-                'enabled': True,
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+# Shared read-only base, per-role variants only override the language fields
+_base_settings = _freeze(
+    {
+        'input_stream': {
+            'content_type': 'audio',
+            'source': {
+                'type': 'ws',
+                'format': 'pcm_s16le',
+                'sample_rate': 24_000,
+                'channels': 1,
             },
-            'verification': {
-                'auto_transcription_correction': False,
-                'transcription_correction_style': None,
+        },
+        'output_stream': {
+            'content_type': 'audio',
+            'target': {'type': 'ws', 'format': 'pcm_s16le', 'sample_rate': 24_000, 'channels': 1},
+        },
+        'pipeline': {
+            'preprocessing': {},
+            'transcription': {
+                'source_language': None,
+                'detectable_languages': ['ru', 'en', 'de', 'es', 'tr'],
+                'asr_model': 'auto',
+                'segment_confirmation_silence_threshold': 0.7,
+                'sentence_splitter': {
+                    'enabled': True,
+                },
+                'verification': {
+                    'auto_transcription_correction': False,
+                    'transcription_correction_style': None,
+                },
             },
+            'translations': [
+                {
+                    'target_language': None,
+                    'translate_partial_transcriptions': False,
+                },
+            ],
         },
-        'translations': [
-            {
-                'target_language': os.getenv('TARGET_LANGUAGE'),
-                'translate_partial_transcriptions': False,
+        'translation_queue_configs': {
+            'global': {
+                'desired_queue_level_ms': 10000,
+                'max_queue_level_ms': 24000,
+                'auto_tempo': True,
+                'min_tempo': 1.0,
+                'max_tempo': 1.2,
             },
-        ],
-    },
-    'translation_queue_configs': {
-        'global': {
-            'desired_queue_level_ms': 10000,
-            'max_queue_level_ms': 24000,
-            'auto_tempo': True,
-            'min_tempo': 1.0,
-            'max_tempo': 1.2,
         },
-    },
-}
-operator_settings = copy.deepcopy(client_settings)
-operator_settings['pipeline']['translations'][0]['target_language'] = os.getenv('SOURCE_LANGUAGE')
-operator_settings['pipeline']['transcription']['source_language'] = os.getenv('TARGET_LANGUAGE')
+    }
+)
+
+
+def build_settings(source_language: str | None, target_language: str | None) -> Mapping[str, Any]:
+    pipeline = _base_settings['pipeline']
+    return MappingProxyType(
+        {
+            **_base_settings,
+            'pipeline': MappingProxyType(
+                {
+                    **pipeline,
+                    'transcription': MappingProxyType(
+                        {**pipeline['transcription'], 'source_language': source_language}
+                    ),
+                    'translations': (
+                        MappingProxyType({**pipeline['translations'][0], 'target_language': target_language}),
+                    ),
+                }
+            ),
+        }
+    )
+
+
+def build_set_task_message(settings: Mapping[str, Any]) -> bytes:
+    return orjson.dumps({'message_type': 'set_task', 'data': settings}, default=dict)
+
+
+client_settings = build_settings(os.getenv('SOURCE_LANGUAGE'), os.getenv('TARGET_LANGUAGE'))
+operator_settings = build_settings(os.getenv('TARGET_LANGUAGE'), os.getenv('SOURCE_LANGUAGE'))
 role_settings = {
     'client': client_settings,
     'operator': operator_settings,
 }
+# Serialized once, sent as-is on every call setup
+set_task_messages = {role: build_set_task_message(settings) for role, settings in role_settings.items()}
@@ -1,6 +1,7 @@
 import asyncio
 import logging
 
+import orjson
 from starlette.websockets import WebSocket
 
 logger = logging.getLogger(__name__)
@@ -24,12 +25,15 @@ async def broadcast_transcription(
         'timestamp': asyncio.get_event_loop().time(),
     }
 
+    # Serialize once and fan out the same text frame to every client
+    payload = orjson.dumps(message).decode()
+    websockets = list(transcription_websockets)
+    results = await asyncio.gather(*(ws.send_text(payload) for ws in websockets), return_exceptions=True)
+
     disconnected_websockets = set()
-    for ws in transcription_websockets:
-        try:
-            await ws.send_json(message)
-        except Exception as e:
-            logging.error(f'Error sending transcription to web client: {e}')
+    for ws, result in zip(websockets, results):
+        if isinstance(result, Exception):
+            logger.error('Error sending transcription to web client: %s', result)
             disconnected_websockets.add(ws)
 
     # Remove disconnected clients
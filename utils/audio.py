@@ -1,59 +1,68 @@
-import audioop
 import logging
 import os
 from typing import Any
 
 import numpy as np
 
+from .kernels import (
+    decimate3_i16,
+    decimation_filter,
+    lin2ulaw_i16,
+    mix_clip_i16,
+    new_resample_state,
+    precompile_kernels,
+    scale_clip_i16,
+    ulaw_to_pcm24k,
+)
 from .worker import BaseWorkerProcess
 
 logger = logging.getLogger(__name__)
 
 
-def convert_mulaw_to_pcm(mulaw_bytes: bytes) -> bytes:
-    pcm_8k = audioop.ulaw2lin(mulaw_bytes, 2)
-    return audioop.ratecv(pcm_8k, 2, 1, 8000, 24000, None)[0]
+def convert_mulaw_to_pcm(mulaw_bytes: bytes, state: np.ndarray | None = None) -> tuple[bytes, np.ndarray]:
+    """Convert 8 kHz mu-law to 24 kHz pcm_s16le.
 
+    ``state`` is the resampler state returned by the previous call for the same stream,
+    so the filter history carries across chunks instead of restarting at every boundary.
+    """
+    if state is None:
+        state = new_resample_state()
 
-class MulawToPcmWorker(BaseWorkerProcess):
-    def init_worker(self):
-        self.pid = os.getpid()
-        logger.info('[MulawToPcmWorker instance started] PID=%s', self.pid)
-
-    def handle(self, mulaw_bytes: bytes) -> bytes:
-        pcm_8k = audioop.ulaw2lin(mulaw_bytes, 2)
-        return audioop.ratecv(pcm_8k, 2, 1, 8000, 24000, None)[0]
+    src = np.frombuffer(mulaw_bytes, dtype=np.uint8)
+    dst = np.empty(len(src) * 3, dtype=np.int16)
+    ulaw_to_pcm24k(src, dst, state)
+    return dst.tobytes(), state
 
 
 class MixingWorker(BaseWorkerProcess):
+    @classmethod
+    def precompile(cls) -> None:
+        precompile_kernels()
+
     def init_worker(self):
         self.pid = os.getpid()
-        logger.info('[MixingWorker instance started] PID=%s', self.pid)
+        logger.debug('[MixingWorker instance started] PID=%s', self.pid)
+        self._down_taps = decimation_filter()
 
-    def handle(self, payload: dict[str, Any]) -> bytes:
+    def handle(self, payload: dict[str, Any]) -> np.ndarray:
+        """Mix two 24 kHz pcm_s16le chunks into 8 kHz mu-law, returned as a uint8 array."""
         chunk1 = payload['chunk1']
         chunk2 = payload.get('chunk2')
         vol_a = payload.get('vol_a', 0.5)
         vol_b = payload.get('vol_b', 0.5)
-        pcm_a = np.frombuffer(chunk1, dtype=np.int16).astype(np.int32)
+        pcm_a = np.frombuffer(chunk1, dtype=np.int16)
 
         if chunk2 is None:
             # Mixing with silence
-            mixed = pcm_a * vol_a
-            mixed = np.clip(mixed, -32768, 32767).astype(np.int16)
-            mixed_8k = audioop.ratecv(mixed.tobytes(), 2, 1, 24000, 8000, None)[0]
-            return audioop.lin2ulaw(mixed_8k, 2)
-
-        pcm_b = np.frombuffer(chunk2, dtype=np.int16).astype(np.int32)
+            mixed = scale_clip_i16(pcm_a, vol_a)
+            mixed_8k = decimate3_i16(mixed, self._down_taps)
+            return lin2ulaw_i16(mixed_8k)
 
-        target_len = max(len(pcm_a), len(pcm_b))
-        if len(pcm_a) < target_len:
-            pcm_a = np.pad(pcm_a, (0, target_len - len(pcm_a)), 'constant')
-        if len(pcm_b) < target_len:
-            pcm_b = np.pad(pcm_b, (0, target_len - len(pcm_b)), 'constant')
+        pcm_b = np.frombuffer(chunk2, dtype=np.int16)
 
-        mixed = (pcm_a * vol_a + pcm_b * vol_b) / (vol_a + vol_b)
-        mixed = np.clip(mixed, -32768, 32767).astype(np.int16)
-        mixed_8k = audioop.ratecv(mixed.tobytes(), 2, 1, 24000, 8000, None)[0]
+        # Normalise the weights up front, so the kernel does two multiplies per sample
+        inv = 1.0 / (vol_a + vol_b)
+        mixed = mix_clip_i16(pcm_a, pcm_b, vol_a * inv, vol_b * inv)
+        mixed_8k = decimate3_i16(mixed, self._down_taps)
 
-        return audioop.lin2ulaw(mixed_8k, 2)
+        return lin2ulaw_i16(mixed_8k)
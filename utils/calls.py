@@ -1,6 +1,7 @@
 import asyncio
 import logging
 import os
+import time
 import uuid
 
 from fastapi import HTTPException, Request
@@ -11,6 +12,8 @@ from twilio.twiml.voice_response import Play, VoiceResponse
 
 from settings import host
 
+logger = logging.getLogger(__name__)
+
 
 class CallSession:
     def __init__(self, source_phone_number: str, target_phone_number: str):
@@ -27,9 +30,58 @@ class CallSession:
         self.client_stream_sid_event = asyncio.Event()
         self.operator_stream_sid_event = asyncio.Event()
         self.completed = False
+        # Open media streams and the last time one started or ended, for SessionStore expiry
+        self.active_streams = 0
+        self.last_seen = time.monotonic()
 
         self._intermediate_number = os.getenv('TWILIO_NUMBER')
 
+    def stream_started(self):
+        self.active_streams += 1
+        self.last_seen = time.monotonic()
+
+    def stream_ended(self):
+        self.active_streams -= 1
+        self.last_seen = time.monotonic()
+
+
+class SessionStore:
+    """Call sessions by ID, dropping the ones with no open media stream for ``ttl`` seconds."""
+
+    def __init__(self, ttl: float = 3600, sweep_interval: float = 60):
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._sessions: dict[str, CallSession] = {}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def add(self, session: CallSession):
+        self._sessions[session.session_id] = session
+
+    def get(self, session_id: str) -> CallSession | None:
+        return self._sessions.get(session_id)
+
+    def pop(self, session_id: str) -> CallSession | None:
+        return self._sessions.pop(session_id, None)
+
+    def sweep(self) -> int:
+        deadline = time.monotonic() - self.ttl
+        expired = [
+            session_id
+            for session_id, session in self._sessions.items()
+            if not session.active_streams and session.last_seen < deadline
+        ]
+        for session_id in expired:
+            del self._sessions[session_id]
+        return len(expired)
+
+    async def run_sweeper(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            expired = self.sweep()
+            logger.info('Call sessions: %d active, %d expired', len(self), expired)
+
 
 def get_free_operator_number() -> str:
     return os.getenv('OPERATOR_NUMBER')
@@ -49,11 +101,12 @@ async def make_call_to_operator(twilio_client: Client, session: CallSession):
         status_callback_method='POST',
     )
 
-    logging.info(f'Call SID to operator: {call.sid}')
+    logger.info('Call SID to operator: %s', call.sid)
 
 
 async def verify_twilio_signature(request: Request):
-    validator = RequestValidator(os.getenv('TWILIO_AUTH_TOKEN'))
+    # Built once in the app lifespan with TWILIO_AUTH_TOKEN
+    validator: RequestValidator = request.app.twilio_validator
     signature = request.headers.get('X-Twilio-Signature', '')
     payload = await request.form()
 
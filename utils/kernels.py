@@ -0,0 +1,200 @@
+import numpy as np
+from numba import njit
+
+UPSAMPLE = 3  # 8 kHz -> 24 kHz
+FIR_TAPS = 33
+TAPS_PER_PHASE = FIR_TAPS // UPSAMPLE
+RESAMPLE_HISTORY = TAPS_PER_PHASE - 1
+INTERPOLATION_CUTOFF_HZ = 3_950
+INTERPOLATION_KAISER_BETA = 2.5
+
+DOWNSAMPLE = 3  # 24 kHz -> 8 kHz
+DECIMATION_TAPS = 49  # odd, so the centred filter has an integer delay
+DECIMATION_CUTOFF_HZ = 3_850
+DECIMATION_KAISER_BETA = 4.5
+
+
+def _ulaw_decode_table() -> np.ndarray:
+    """Sun/G.711 mu-law expansion for all 256 code words."""
+    table = np.empty(256, dtype=np.int16)
+    for code in range(256):
+        u_val = ~code & 0xFF
+        t = ((u_val & 0x0F) << 3) + 0x84
+        t <<= (u_val & 0x70) >> 4
+        table[code] = 0x84 - t if u_val & 0x80 else t - 0x84
+    return table
+
+
+def _kaiser_lowpass(num_taps: int, cutoff_hz: float, beta: float, gain: float) -> np.ndarray:
+    """Kaiser-windowed sinc lowpass at 24 kHz with the given DC gain."""
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    taps = np.sinc(2 * cutoff_hz / 24_000 * n) * np.kaiser(num_taps, beta)
+    return taps * (gain / taps.sum())
+
+
+def _interpolation_filter() -> np.ndarray:
+    """Lowpass for the 3x interpolator, split into polyphase branches.
+
+    Flat within ~0.6 dB up to 3.4 kHz (telephone band) and over 30 dB down on the images from 4.6 kHz.
+    """
+    taps = _kaiser_lowpass(FIR_TAPS, INTERPOLATION_CUTOFF_HZ, INTERPOLATION_KAISER_BETA, UPSAMPLE)
+    # phases[p, j] is applied to x[k - RESAMPLE_HISTORY + j] when producing output sample UPSAMPLE * k + p.
+    # Time-reversed, so the kernel runs each branch forward over a contiguous window.
+    return np.ascontiguousarray(taps.reshape(TAPS_PER_PHASE, UPSAMPLE).T[:, ::-1], dtype=np.float32)
+
+
+def decimation_filter() -> np.ndarray:
+    """Anti-alias lowpass for the 3:1 decimator, within ~0.8 dB to 3.4 kHz and ~50 dB down from 4.6 kHz."""
+    return _kaiser_lowpass(DECIMATION_TAPS, DECIMATION_CUTOFF_HZ, DECIMATION_KAISER_BETA, 1.0).astype(np.float32)
+
+
+ULAW_DECODE = _ulaw_decode_table()
+INTERPOLATION_PHASES = _interpolation_filter()
+
+
+def new_resample_state() -> np.ndarray:
+    return np.zeros(RESAMPLE_HISTORY, dtype=np.int16)
+
+
+@njit(cache=True, nogil=True, fastmath=True, boundscheck=False)
+def ulaw_to_pcm24k(src: np.ndarray, dst: np.ndarray, state: np.ndarray) -> None:
+    """Decode 8 kHz mu-law from ``src`` into 24 kHz int16 ``dst`` (``3 * len(src)`` samples).
+
+    ``state`` holds the last ``RESAMPLE_HISTORY`` decoded input samples and is updated in place.
+    Decoding into a small contiguous scratch first lets the FIR loop vectorise, which measured
+    faster than decoding into a ring buffer inside the filter loop.
+    """
+    hist = state.shape[0]
+    n = src.shape[0]
+
+    work = np.empty(hist + n, dtype=np.float32)
+    for i in range(hist):
+        work[i] = state[i]
+    for i in range(n):
+        work[hist + i] = ULAW_DECODE[src[i]]
+
+    for k in range(n):
+        for p in range(UPSAMPLE):
+            acc = np.float32(0.0)
+            # work[k + j] == x[k - RESAMPLE_HISTORY + j]
+            for j in range(TAPS_PER_PHASE):
+                acc += work[k + j] * INTERPOLATION_PHASES[p, j]
+            if acc > 32767.0:
+                acc = 32767.0
+            elif acc < -32768.0:
+                acc = -32768.0
+            dst[UPSAMPLE * k + p] = np.int16(np.rint(acc))
+
+    for i in range(hist):
+        state[i] = np.int16(work[n + i])
+
+
+@njit(cache=True, nogil=True, fastmath=True, boundscheck=False)
+def mix_clip_i16(a: np.ndarray, b: np.ndarray, wa: float, wb: float) -> np.ndarray:
+    """``a * wa + b * wb`` in float32, saturated to int16.
+
+    The shorter buffer counts as zero-padded: its overlap is mixed and the rest of the longer one only scaled.
+    """
+    wa32 = np.float32(wa)
+    wb32 = np.float32(wb)
+    common = min(a.shape[0], b.shape[0])
+    out = np.empty(max(a.shape[0], b.shape[0]), dtype=np.int16)
+    for i in range(common):
+        v = np.float32(a[i]) * wa32 + np.float32(b[i]) * wb32
+        out[i] = -32768 if v < -32768.0 else 32767 if v > 32767.0 else np.int16(v)
+
+    tail, w = (a, wa32) if a.shape[0] > common else (b, wb32)
+    for i in range(common, tail.shape[0]):
+        v = np.float32(tail[i]) * w
+        out[i] = -32768 if v < -32768.0 else 32767 if v > 32767.0 else np.int16(v)
+    return out
+
+
+@njit(cache=True, nogil=True, fastmath=True, boundscheck=False)
+def scale_clip_i16(a: np.ndarray, wa: float) -> np.ndarray:
+    """``a * wa`` in float32 saturated to int16, the mix against silence."""
+    wa32 = np.float32(wa)
+    out = np.empty(a.shape[0], dtype=np.int16)
+    for i in range(a.shape[0]):
+        v = np.float32(a[i]) * wa32
+        out[i] = -32768 if v < -32768.0 else 32767 if v > 32767.0 else np.int16(v)
+    return out
+
+
+@njit(cache=True, nogil=True, fastmath=True, boundscheck=False)
+def lin2ulaw_i16(src: np.ndarray) -> np.ndarray:
+    """G.711 mu-law compression of int16 samples, bit-exact with ``audioop.lin2ulaw``.
+
+    Pure integer arithmetic with the segment counted by comparisons, so the loop vectorises without a table lookup.
+    """
+    out = np.empty(src.shape[0], dtype=np.uint8)
+    for i in range(src.shape[0]):
+        pcm = np.int32(src[i]) >> 2  # 14-bit
+        mask = 0x7F if pcm < 0 else 0xFF
+        magnitude = min(-pcm if pcm < 0 else pcm, 8159) + 0x21
+        segment = (
+            (magnitude > 0x3F)
+            + (magnitude > 0x7F)
+            + (magnitude > 0xFF)
+            + (magnitude > 0x1FF)
+            + (magnitude > 0x3FF)
+            + (magnitude > 0x7FF)
+            + (magnitude > 0xFFF)
+            + (magnitude > 0x1FFF)
+        )
+        code = 0x7F if segment >= 8 else (segment << 4) | ((magnitude >> (segment + 1)) & 0x0F)
+        out[i] = (code ^ mask) & 0xFF
+    return out
+
+
+@njit(cache=True, nogil=True, fastmath=True, boundscheck=False)
+def decimate3_i16(src: np.ndarray, taps: np.ndarray) -> np.ndarray:
+    """Lowpass and keep every third sample of a self-contained 24 kHz chunk.
+
+    The filter is centred on each output sample and the chunk edges are extended,
+    so the output has no delay and no ramp from zero at chunk boundaries. ``taps`` must be symmetric.
+    """
+    n = src.shape[0]
+    num_taps = taps.shape[0]
+    half = (num_taps - 1) // 2
+
+    # Point-reflect past the edges, which keeps the local slope and avoids a step at the boundary
+    offset = num_taps - half - 1
+    work = np.empty(n + num_taps, dtype=np.float32)
+    for i in range(work.shape[0]):
+        idx = i - offset
+        if idx < 0:
+            work[i] = 2 * np.float32(src[0]) - src[min(-idx, n - 1)]
+        elif idx >= n:
+            work[i] = 2 * np.float32(src[n - 1]) - src[max(2 * (n - 1) - idx, 0)]
+        else:
+            work[i] = src[idx]
+
+    out = np.empty((n + DOWNSAMPLE - 1) // DOWNSAMPLE, dtype=np.int16)
+    for k in range(out.shape[0]):
+        acc = np.float32(0.0)
+        # work[DOWNSAMPLE * k + j] == src[DOWNSAMPLE * k - half + j]. The taps are symmetric (linear phase),
+        # so the convolution is a forward dot product over a contiguous window, which vectorises.
+        base = DOWNSAMPLE * k
+        for j in range(num_taps):
+            acc += work[base + j] * taps[j]
+        if acc > 32767.0:
+            acc = 32767.0
+        elif acc < -32768.0:
+            acc = -32768.0
+        out[k] = np.int16(np.rint(acc))
+    return out
+
+
+def precompile_kernels() -> None:
+    """Compile every kernel for the argument types used at runtime, so the first audio frame does not pay for the JIT.
+
+    Payloads arrive as read-only buffers (bytes, or read-only views over ``PayloadArena`` slots),
+    which Numba compiles separately from writable arrays.
+    """
+    chunk = np.frombuffer(bytes(6), dtype=np.int16)
+    taps = decimation_filter()
+
+    ulaw_to_pcm24k(np.frombuffer(bytes(1), dtype=np.uint8), np.empty(UPSAMPLE, dtype=np.int16), new_resample_state())
+    scale_clip_i16(chunk, 0.5)
+    lin2ulaw_i16(decimate3_i16(mix_clip_i16(chunk, chunk, 0.5, 0.5), taps))
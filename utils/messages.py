@@ -0,0 +1,51 @@
+import msgspec
+
+
+class TwilioMedia(msgspec.Struct):
+    payload: str
+
+
+class TwilioStart(msgspec.Struct):
+    stream_sid: str = msgspec.field(name='streamSid')
+
+
+class TwilioEvent(msgspec.Struct):
+    event: str
+    media: TwilioMedia | None = None
+    start: TwilioStart | None = None
+
+
+class PalabraMessage(msgspec.Struct):
+    message_type: str = ''
+    # Decoded lazily by message type, Palabra sometimes sends it as a JSON-encoded string
+    data: msgspec.Raw = msgspec.Raw()
+
+
+class PalabraAudio(msgspec.Struct):
+    data: str = ''
+
+
+class Transcription(msgspec.Struct):
+    text: str = ''
+    language: str | None = ''
+    transcription_id: str | None = None
+
+
+class PalabraTranscription(msgspec.Struct):
+    transcription: Transcription = msgspec.field(default_factory=Transcription)
+
+
+twilio_decoder = msgspec.json.Decoder(TwilioEvent)
+palabra_decoder = msgspec.json.Decoder(PalabraMessage)
+palabra_audio_decoder = msgspec.json.Decoder(PalabraAudio)
+palabra_transcription_decoder = msgspec.json.Decoder(PalabraTranscription)
+_str_decoder = msgspec.json.Decoder(str)
+
+
+def decode_palabra_data(raw: msgspec.Raw, decoder: msgspec.json.Decoder):
+    """Decode the ``data`` field of a Palabra message, unwrapping it if it is a JSON string."""
+    if not len(raw):
+        return decoder.decode(b'{}')
+    if memoryview(raw)[:1] == b'"':
+        return decoder.decode(_str_decoder.decode(raw))
+    return decoder.decode(raw)
@@ -1,43 +1,252 @@
 import asyncio
+import itertools
 import multiprocessing as mp
-import uuid
-from abc import ABC, abstractmethod
-from concurrent.futures import ThreadPoolExecutor
-from contextlib import suppress
+import os
+import sys
+import threading
+from collections.abc import Sequence
 from logging import getLogger
+from multiprocessing.shared_memory import SharedMemory
 from queue import Empty
-from typing import Any, List, Sequence, Tuple, Type
+from typing import Any, NamedTuple
+from weakref import WeakValueDictionary
+
+import numpy as np
 
 logger = getLogger(__name__)
 
+# Queue items drained without blocking after each blocking get
+MAX_DRAIN = 64
+
+
+def parse_cpus(value: str | None) -> list[int]:
+    """CPU numbers from a comma-separated list such as ``2,3``, skipping empty and invalid entries."""
+    cpus = []
+    for entry in (value or '').split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        try:
+            cpus.append(int(entry))
+        except ValueError:
+            logger.warning('Ignoring invalid CPU number %r', entry)
+    return cpus
+
+
+def parse_nice(value: str | None) -> int:
+    """Niceness increment from ``value``, falling back to 0 when it is empty or invalid."""
+    if not (value or '').strip():
+        return 0
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning('Ignoring invalid niceness %r', value)
+        return 0
+
+
+def set_scheduling(cpus: Sequence[int] | None = None, nice: int = 0) -> None:
+    """Pin the current process to ``cpus`` and raise its niceness by ``nice``, where the platform allows it."""
+    name = mp.current_process().name
+    if cpus:
+        try:
+            os.sched_setaffinity(0, set(cpus))
+        except (AttributeError, OSError) as e:
+            logger.warning('Could not pin %s to CPUs %s: %s', name, cpus, e)
+    if nice:
+        # Negative values need CAP_SYS_NICE
+        try:
+            os.nice(nice)
+        except OSError as e:
+            logger.warning('Could not change niceness of %s by %s: %s', name, nice, e)
+
+
+class ShmRef(NamedTuple):
+    """Location of a buffer inside a ``PayloadArena``."""
+
+    offset: int
+    length: int
+
+
+class PayloadArena:
+    """Fixed-size shared memory slots that carry bytes payloads and results instead of pickling them.
+
+    Only the manager allocates and frees slots. A task keeps its slot until the result has been read back,
+    and the worker writes the result over the payload, so no other synchronisation is needed.
+    """
+
+    def __init__(self, slots: int, slot_size: int, name: str | None = None) -> None:
+        self.slot_size = slot_size
+        self.shm = SharedMemory(name=name, create=name is None, size=slots * slot_size)
+        self.free: list[int] = list(range(slots)) if name is None else []
+
+    def pack(self, payload: Any) -> tuple[int, Any]:
+        """Move a bytes payload, or the bytes values of a dict payload, into a free slot.
+
+        Returns the slot and the payload with the buffers replaced by ``ShmRef``. The slot is -1 and the payload
+        is sent as is if no slot is free or it does not fit.
+        """
+        if isinstance(payload, bytes):
+            size = len(payload)
+        elif isinstance(payload, dict):
+            size = sum(len(v) for v in payload.values() if isinstance(v, bytes))
+        else:
+            return -1, payload
+        if not self.free or not 0 < size <= self.slot_size:
+            return -1, payload
+
+        slot = self.free.pop()
+        offset = slot * self.slot_size
+        if isinstance(payload, bytes):
+            return slot, self._write(offset, payload)
+
+        packed = {}
+        for key, value in payload.items():
+            if isinstance(value, bytes):
+                packed[key] = self._write(offset, value)
+                offset += len(value)
+            else:
+                packed[key] = value
+        return slot, packed
+
+    def unpack(self, payload: Any) -> Any:
+        """Replace ``ShmRef`` in a packed payload with read-only memoryviews over the slot."""
+        if isinstance(payload, ShmRef):
+            return self._view(payload)
+        if isinstance(payload, dict):
+            return {k: self._view(v) if isinstance(v, ShmRef) else v for k, v in payload.items()}
+        return payload
+
+    def store(self, slot: int, result: Any) -> Any:
+        """Write a bytes or ndarray result into the task's slot, once the payload there is no longer needed.
+
+        The manager reads it back as bytes, so workers can return arrays without converting them first.
+        """
+        if slot < 0 or not isinstance(result, (bytes, np.ndarray)) or memoryview(result).nbytes > self.slot_size:
+            return result
+        return self._write(slot * self.slot_size, result)
+
+    def release(self, slot: int, result: Any) -> Any:
+        """Copy a stored result out of its slot and return the slot to the free list."""
+        if isinstance(result, ShmRef):
+            result = bytes(self._view(result))
+        if slot >= 0:
+            self.free.append(slot)
+        return result
+
+    def close(self, unlink: bool = False) -> None:
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+    def _write(self, offset: int, data: bytes | np.ndarray) -> ShmRef:
+        view = memoryview(data).cast('B')
+        self.shm.buf[offset : offset + view.nbytes] = view
+        return ShmRef(offset, view.nbytes)
+
+    def _view(self, ref: ShmRef) -> memoryview:
+        # Read-only, so workers cannot write into a slot they do not own
+        return self.shm.buf[ref.offset : ref.offset + ref.length].toreadonly()
+
+
+class BatchFuture:
+    """Collects the results of one ``submit_many`` call into a single future.
+
+    Task ids of a call are consecutive, so a result's position is its offset from the first id.
+    """
+
+    __slots__ = ('__weakref__', 'first_id', 'future', 'pending', 'results')
+
+    def __init__(self, future: asyncio.Future[list[Any]], first_id: int, size: int) -> None:
+        self.future = future
+        self.first_id = first_id
+        self.results: list[Any] = [None] * size
+        self.pending = size
 
-class BaseWorkerProcess(ABC):
-    def __init__(self, input_queue: mp.Queue, output_queue: mp.Queue):
+    def done(self) -> bool:
+        return self.future.done()
+
+    def set_exception(self, exc: BaseException) -> None:
+        self.future.set_exception(exc)
+
+    def cancel(self) -> bool:
+        return self.future.cancel()
+
+    def set_item(self, task_id: int, result: Any) -> None:
+        self.results[task_id - self.first_id] = result
+        self.pending -= 1
+        if not self.pending:
+            self.future.set_result(self.results)
+
+
+class BaseWorkerProcess:
+    """Worker process loop. Subclasses implement ``init_worker`` and ``handle``."""
+
+    def __init__(
+        self,
+        input_queue: mp.Queue,
+        output_queue: mp.Queue,
+        arena: tuple[str, int, int] | None = None,
+    ):
         self.input_queue = input_queue
         self.output_queue = output_queue
+        self.arena = PayloadArena(arena[1], arena[2], name=arena[0]) if arena is not None else None
         self.init_worker()
 
-    @abstractmethod
+    @classmethod
+    def precompile(cls) -> None:
+        """Run once in the manager process before the workers start, e.g. to compile JIT kernels.
+
+        Forked workers inherit the result, spawned ones load it from the Numba disk cache.
+        """
+
     def init_worker(self):
         raise NotImplementedError
 
     def run(self) -> None:
-        while True:
-            item: Any = self.input_queue.get()
-            if item is None:
-                logger.info('%s exiting...', mp.current_process().name)
-                break
+        # Bound once, the loop below runs per task
+        get, get_nowait, put = self.input_queue.get, self.input_queue.get_nowait, self.output_queue.put
+        handle, arena = self.handle, self.arena
 
-            batch: Sequence[Tuple[str, Any]] = item if isinstance(item, list) else [item]
+        running = True
+        while running:
+            items: list[Any] = [get()]
+            # Take whatever else is already queued, so one wakeup covers many short tasks
+            while len(items) <= MAX_DRAIN and items[-1] is not None:
+                try:
+                    items.append(get_nowait())
+                except Empty:
+                    break
+
+            if items[-1] is None:
+                running = False
+                items.pop()
 
-            for task_id, payload in batch:
+            batch: list[tuple[int, int, Any]] = []
+            for item in items:
+                if isinstance(item, list):
+                    batch.extend(item)
+                else:
+                    batch.append(item)
+
+            results: list[tuple[int, int, Any, str | None]] = []
+            append = results.append
+            for task_id, slot, payload in batch:
                 try:
-                    result = self.handle(payload)
-                    self.output_queue.put((task_id, result, None))
+                    if slot >= 0:
+                        result = arena.store(slot, handle(arena.unpack(payload)))
+                    else:
+                        result = handle(payload)
+                    if isinstance(result, np.ndarray):
+                        # Not stored in a slot, send it as the bytes a stored result is read back as
+                        result = result.tobytes()
+                    append((task_id, slot, result, None))
                 except Exception as exc:
-                    self.output_queue.put((task_id, None, str(exc)))
+                    append((task_id, slot, None, str(exc)))
+            if results:
+                put(results)
+
+        logger.info('%s exiting...', mp.current_process().name)
 
-    @abstractmethod
     def handle(self, payload: Any) -> Any:
         raise NotImplementedError
 
@@ -45,122 +254,180 @@ class BaseWorkerProcess(ABC):
 class AsyncProcessManager:
     def __init__(
         self,
-        worker_cls: Type[BaseWorkerProcess],
+        worker_cls: type[BaseWorkerProcess],
         processes: int = 1,
-        threadpool_size: int = 16,
+        arena_slots: int = 256,
+        arena_slot_size: int = 32 * 1024,
+        cpus: Sequence[int] | None = None,
+        nice: int = 0,
     ) -> None:
         if processes < 1:
             raise ValueError('`processes` must be >= 1')
 
-        self.input_queue: mp.Queue = mp.Queue()
-        self.output_queue: mp.Queue = mp.Queue()
-        self.executor = ThreadPoolExecutor(max_workers=threadpool_size)
+        # Fork on Linux, so workers start without re-importing numpy and Numba and share the parent's pages.
+        # Elsewhere keep the platform default: fork is unsafe on macOS once system frameworks have started threads.
+        self.context = mp.get_context('fork' if sys.platform.startswith('linux') else None)
+
+        # One input queue per worker, so processes do not contend on a shared queue lock
+        self.input_queues: list[mp.Queue] = [self.context.Queue() for _ in range(processes)]
+        self.next_queue = itertools.cycle(self.input_queues).__next__
+        self.output_queue: mp.Queue = self.context.Queue()
         self.loop = asyncio.get_event_loop()
-        self.futures: dict[str, asyncio.Future[Any]] = {}
+        # Awaiting callers hold the only strong references, so abandoned tasks drop out on their own
+        self.futures: WeakValueDictionary[int, asyncio.Future[Any] | BatchFuture] = WeakValueDictionary()
+        self.task_ids = itertools.count()
         self.worker_cls = worker_cls
 
+        worker_cls.precompile()
+
+        self.arena: PayloadArena | None = None
+        arena: tuple[str, int, int] | None = None
+        if arena_slots > 0:
+            self.arena = PayloadArena(arena_slots, arena_slot_size)
+            arena = (self.arena.shm.name, arena_slots, arena_slot_size)
+
         self.procs: list[mp.Process] = []
-        for idx in range(processes):
-            p = mp.Process(
+        for idx, input_queue in enumerate(self.input_queues):
+            p = self.context.Process(
                 name=f'{worker_cls.__name__}-{idx}',
                 target=self.start_worker,
-                args=(worker_cls, self.input_queue, self.output_queue),
+                args=(
+                    worker_cls,
+                    input_queue,
+                    self.output_queue,
+                    arena,
+                    cpus[idx % len(cpus)] if cpus else None,
+                    nice,
+                ),
                 daemon=True,
             )
             p.start()
             self.procs.append(p)
 
-        self.output_task = self.loop.create_task(self.poll_output())
+        self.reader = threading.Thread(target=self.read_output, name=f'{worker_cls.__name__}-reader', daemon=True)
+        self.reader.start()
 
     @staticmethod
     def start_worker(
-        worker_cls: Type[BaseWorkerProcess],
+        worker_cls: type[BaseWorkerProcess],
         in_q: mp.Queue,
         out_q: mp.Queue,
+        arena: tuple[str, int, int] | None = None,
+        cpu: int | None = None,
+        nice: int = 0,
     ) -> None:
-        worker = worker_cls(in_q, out_q)
+        set_scheduling([cpu] if cpu is not None else None, nice)
+        worker = worker_cls(in_q, out_q, arena)
         worker.run()
 
     async def submit(self, data: Any) -> Any:
-        task_id = uuid.uuid4().hex
+        task_id = next(self.task_ids)
         fut = self.loop.create_future()
         self.futures[task_id] = fut
-        self.input_queue.put((task_id, data))
+        self.next_queue().put((task_id, *self.pack(data)))
         return await fut
 
     async def submit_many(
         self,
-        data: List[Any],
+        data: list[Any],
         batch_size: int = 32,
-    ) -> List[Any]:
+    ) -> list[Any]:
         if batch_size < 1:
             raise ValueError('`batch_size` must be >= 1')
 
-        pending_futures: List[asyncio.Future[Any]] = []
+        if not data:
+            return []
+
+        # One future for the whole call instead of one per task and a gather over them
+        task_ids = list(itertools.islice(self.task_ids, len(data)))
+        batch_future = BatchFuture(self.loop.create_future(), task_ids[0], len(data))
 
         for idx in range(0, len(data), batch_size):
             batch_items = data[idx : idx + batch_size]
 
-            queued_batch: List[Tuple[str, Any]] = []
-            for payload in batch_items:
-                task_id = uuid.uuid4().hex
-                fut = self.loop.create_future()
-                self.futures[task_id] = fut
-                pending_futures.append(fut)
-                queued_batch.append((task_id, payload))
+            queued_batch: list[tuple[int, int, Any]] = []
+            for task_id, payload in zip(task_ids[idx : idx + batch_size], batch_items):
+                self.futures[task_id] = batch_future
+                queued_batch.append((task_id, *self.pack(payload)))
 
-            self.input_queue.put(queued_batch)
+            self.next_queue().put(queued_batch)
 
-        return await asyncio.gather(*pending_futures)
+        return await batch_future.future
+
+    def pack(self, payload: Any) -> tuple[int, Any]:
+        if self.arena is None:
+            return -1, payload
+        return self.arena.pack(payload)
 
     async def close(self) -> None:
         logger.info('Closing process manager: %s', self.worker_cls.__name__)
-        for _ in self.procs:
-            self.input_queue.put(None)
-
-        self.output_task.cancel()
-        with suppress(asyncio.CancelledError):
-            await self.output_task
+        for input_queue in self.input_queues:
+            input_queue.put(None)
 
         for proc in self.procs:
             proc.join(timeout=1)
         logger.info('All processes joined: %s', self.worker_cls.__name__)
 
-        for fut in self.futures.values():
-            if not fut.done():
-                fut.set_exception(asyncio.CancelledError())
+        self.output_queue.put(None)
+        self.reader.join(timeout=1)
+
+        for fut in list(self.futures.values()):
+            fut.cancel()
         self.futures.clear()
 
-    async def poll_output(self) -> None:
+        if self.arena is not None:
+            self.arena.close(unlink=True)
+            self.arena = None
+
+    def read_output(self) -> None:
+        """Reader thread: collect every result already queued and hand them to the loop in one callback."""
         while True:
+            item = self.output_queue.get()
+            if item is None:
+                return
+
+            results = list(item)
+            while True:
+                try:
+                    item = self.output_queue.get_nowait()
+                except Empty:
+                    break
+                if item is None:
+                    self.deliver(results)
+                    return
+                results.extend(item)
+
+            if not self.deliver(results):
+                return
+
+    def deliver(self, results: list[tuple[int, int, Any, str | None]]) -> bool:
+        try:
+            self.loop.call_soon_threadsafe(self.handle_results, results)
+        except RuntimeError:
+            # Event loop is closed, nobody is waiting for results any more
+            return False
+        return True
+
+    def handle_results(self, results: list[tuple[int, int, Any, str | None]]) -> None:
+        for task_id, slot, result, error in results:
             try:
-                while True:
-                    try:
-                        item = self.output_queue.get_nowait()
-                        self.handle_item(item)
-                    except Empty:
-                        break
-
-                item = await self.loop.run_in_executor(None, self.output_queue.get)
-                self.handle_item(item)
-            except asyncio.CancelledError:
-                raise
+                if self.arena is not None:
+                    result = self.arena.release(slot, result)
+                fut = self.futures.pop(task_id, None)
+                if fut is None or fut.done():
+                    continue
+                if error:
+                    fut.set_exception(RuntimeError(error))
+                elif isinstance(fut, BatchFuture):
+                    fut.set_item(task_id, result)
+                else:
+                    fut.set_result(result)
             except Exception as e:
-                logger.warning('Polling loop failed with:\n', exc_info=e)
-
-    def handle_item(self, item: Tuple[str, Any, str | None]) -> None:
-        task_id, result, error = item
-        fut = self.futures.pop(task_id, None)
-        if fut is None:
-            return
-        if error:
-            fut.set_exception(RuntimeError(error))
-        else:
-            fut.set_result(result)
+                logger.warning('Handling worker result failed with:\n', exc_info=e)
 
     def __del__(self) -> None:
-        for _ in self.procs:
-            self.input_queue.put_nowait(None)
+        for input_queue in self.input_queues:
+            input_queue.put_nowait(None)
 
         for p in self.procs:
             if p.is_alive():
@@ -0,0 +1,77 @@
+import asyncio
+from collections import deque
+from collections.abc import Awaitable, Callable
+from logging import getLogger
+from typing import Any
+
+logger = getLogger(__name__)
+
+
+class QueuedWriter:
+    """Single writer task draining queued messages into a websocket.
+
+    ``send`` only appends to a deque and wakes the writer, so producers never wait on the socket.
+    Once ``max_queue`` messages are waiting, the oldest one is dropped for each new message, so a stalled
+    peer costs stale audio instead of unbounded memory and latency.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Any], Awaitable[None]],
+        name: str,
+        on_error: Callable[[], Awaitable[None]] | None = None,
+        max_queue: int | None = None,
+    ) -> None:
+        self._send = send
+        self._on_error = on_error
+        self._error_task: asyncio.Task | None = None
+        self._queue: deque[Any] = deque()
+        self._max_queue = max_queue
+        self._dropping = False
+        self._loop = asyncio.get_running_loop()
+        self._wake: asyncio.Future[None] = self._loop.create_future()
+        self._closing = False
+        self._task = self._loop.create_task(self._run(), name=name)
+
+    def send(self, message: Any) -> None:
+        if self._task.done():
+            return
+
+        if self._max_queue is not None and len(self._queue) >= self._max_queue:
+            if not self._dropping:
+                self._dropping = True
+                logger.warning(
+                    '%s backlog reached %s messages, dropping the oldest', self._task.get_name(), self._max_queue
+                )
+            self._queue.popleft()
+
+        self._queue.append(message)
+        if not self._wake.done():
+            self._wake.set_result(None)
+
+    async def _run(self) -> None:
+        try:
+            while True:
+                await self._wake
+                self._wake = self._loop.create_future()
+
+                while self._queue:
+                    await self._send(self._queue.popleft())
+                self._dropping = False
+
+                if self._closing:
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error('Error sending message: %s', e)
+            self._queue.clear()
+            if self._on_error is not None:
+                self._error_task = self._loop.create_task(self._on_error())
+
+    async def close(self) -> None:
+        """Flush already queued messages and stop the writer task."""
+        self._closing = True
+        if not self._wake.done():
+            self._wake.set_result(None)
+        await asyncio.gather(self._task, return_exceptions=True)